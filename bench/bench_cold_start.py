@@ -0,0 +1,60 @@
+"""Measure cold start of the API in fresh interpreter processes.
+
+Each run spawns a new Python process and times three phases:
+
+    import        import flask_server_v3
+    create_app    build the app (no DB, no Google client)
+    first ready   first /api/ready request, which creates the schema
+
+Usage:
+    python bench/bench_cold_start.py --runs 10
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = '''
+import json, sys, time
+t0 = time.perf_counter()
+import flask_server_v3
+t1 = time.perf_counter()
+app = flask_server_v3.create_app({'DATABASE': sys.argv[1]})
+t2 = time.perf_counter()
+status = app.test_client().get('/api/ready').status_code
+t3 = time.perf_counter()
+print(json.dumps({'import': t1 - t0, 'create_app': t2 - t1, 'first ready': t3 - t2, 'status': status}))
+'''
+
+def measure_once(tmp, run):
+    env = dict(os.environ, GOOGLE_API_KEY=os.getenv('GOOGLE_API_KEY', 'AIza-benchmark-key'))
+    out = subprocess.run(
+        [sys.executable, '-c', PROBE, os.path.join(tmp, f'cold{run}.db')],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description='Cold-start time of the API')
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        samples = [measure_once(tmp, run) for run in range(args.runs)]
+
+    if any(s['status'] != 200 for s in samples):
+        print('warning: /api/ready did not return 200 in every run')
+
+    print(f"{'phase':>12} {'median ms':>10} {'max ms':>8}")
+    for phase in ('import', 'create_app', 'first ready'):
+        values = [s[phase] * 1000 for s in samples]
+        print(f"{phase:>12} {statistics.median(values):>10.1f} {max(values):>8.1f}")
+    total = [sum(s[p] for p in ('import', 'create_app', 'first ready')) * 1000 for s in samples]
+    print(f"{'total':>12} {statistics.median(total):>10.1f} {max(total):>8.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""Measure API throughput as the number of gunicorn workers grows.
+
+Starts gunicorn with gunicorn.conf.py against a throwaway database for
+each worker count and hammers two endpoints from a pool of client
+threads:
+
+    login    CPU bound (password hashing), limited by the GIL in one process
+    profile  JWT decode plus a few SQLite reads on the shared WAL database
+
+Usage:
+    python bench/bench_workers.py --workers 1,2,4 --duration 10
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def wait_until_up(base_url, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(f"{base_url}/api/health", timeout=1).ok:
+                return
+        except requests.ConnectionError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError('gunicorn did not start')
+
+def hammer(call, clients, duration):
+    """Run call() from many threads for duration seconds, return requests per second"""
+    counts = [0] * clients
+    stop = time.time() + duration
+
+    def worker(i):
+        session = requests.Session()
+        while time.time() < stop:
+            if call(session).ok:
+                counts[i] += 1
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return sum(counts) / duration
+
+def run(workers, port, clients, duration):
+    base_url = f"http://127.0.0.1:{port}"
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ,
+                   PORT=str(port),
+                   WEB_CONCURRENCY=str(workers),
+                   DATABASE_PATH=os.path.join(tmp, 'bench.db'),
+                   GOOGLE_API_KEY=os.getenv('GOOGLE_API_KEY', 'AIza-benchmark-key'))
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py',
+             '--access-logfile', '/dev/null', '--log-level', 'warning', 'flask_server_v3:create_app()'],
+            cwd=ROOT, env=env)
+        try:
+            wait_until_up(base_url)
+            creds = {'username': 'bench', 'email': 'bench@example.com', 'password': 'benchmark'}
+            token = requests.post(f"{base_url}/api/register", json=creds).json()['token']
+            headers = {'Authorization': f'Bearer {token}'}
+
+            login = hammer(lambda s: s.post(f"{base_url}/api/login", json=creds), clients, duration)
+            profile = hammer(lambda s: s.get(f"{base_url}/api/profile", headers=headers), clients, duration)
+            return login, profile
+        finally:
+            server.terminate()
+            server.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description='Throughput vs gunicorn worker count')
+    parser.add_argument('--workers', default='1,2,4', help='comma-separated worker counts')
+    parser.add_argument('--clients', type=int, default=16, help='concurrent client threads')
+    parser.add_argument('--duration', type=float, default=10, help='seconds per endpoint')
+    parser.add_argument('--port', type=int, default=18080)
+    args = parser.parse_args()
+
+    print(f"{'workers':>8} {'login req/s':>12} {'profile req/s':>14}")
+    baseline = None
+    for workers in [int(w) for w in args.workers.split(',')]:
+        login, profile = run(workers, args.port, args.clients, args.duration)
+        baseline = baseline or (login, profile)
+        print(f"{workers:>8} {login:>12.1f} {profile:>14.1f}"
+              f"   (x{login / baseline[0]:.2f} / x{profile / baseline[1]:.2f})")
+
+if __name__ == '__main__':
+    main()
@@ -1,56 +1,52 @@
+import time
+
+# Start of the cold-start clock, read by create_app() and /api/ready
+IMPORT_STARTED = time.perf_counter()
+
 import os
-import sys
-from dotenv import load_dotenv
-from flask import Flask, request, jsonify, send_file
-from flask_cors import CORS
-import googlemaps
+from flask import Blueprint, Flask, current_app, request, jsonify, send_file
 import logging
-import requests
 from datetime import datetime, timedelta
 import sqlite3
 import jwt
 from werkzeug.security import generate_password_hash, check_password_hash
 from functools import wraps
+import hashlib
+import hmac
 import json
+import math
+import re
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
 
-# Load environment variables
-load_dotenv()
-
-GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY')
-JWT_SECRET = os.getenv('JWT_SECRET', 'dev-secret-key-change-in-production')
-
-if not GOOGLE_API_KEY:
-    print("❌ ERROR: GOOGLE_API_KEY not set")
-    sys.exit(1)
-
-# Init Flask
-app = Flask(__name__, static_folder='.', static_url_path='')
-
-# CORS
-CORS(app, resources={
-    r"/api/*": {
-        "origins": ["*"],
-        "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-        "allow_headers": ["Content-Type", "Authorization"],
-        "supports_credentials": True,
-        "max_age": 3600
-    }
-})
-
-try:
-    gmaps = googlemaps.Client(key=GOOGLE_API_KEY)
-except Exception as e:
-    print(f"❌ Google Maps error: {e}")
-    sys.exit(1)
-
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# All routes live on this blueprint; create_app() attaches it to a fresh Flask app
+api = Blueprint('api', __name__)
+
 # ==================== DATABASE ====================
+def get_db():
+    """Open a connection that waits for, instead of failing on, other workers' writes"""
+    conn = sqlite3.connect(current_app.config['DATABASE'], timeout=30)
+    conn.execute('PRAGMA synchronous = NORMAL')
+    return conn
+
 def init_db():
-    conn = sqlite3.connect('travelguide.db')
+    conn = get_db()
+    try:
+        create_schema(conn)
+    finally:
+        # Never leave a half-applied schema holding the write lock
+        conn.close()
+    print("✅ Database initialized")
+
+def create_schema(conn):
     c = conn.cursor()
 
+    # WAL lets readers in every worker proceed while one worker writes
+    c.execute('PRAGMA journal_mode = WAL')
+
     c.execute('''CREATE TABLE IF NOT EXISTS users (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         username TEXT UNIQUE NOT NULL,
@@ -80,14 +76,225 @@ def init_db():
         FOREIGN KEY (user_id) REFERENCES users (id)
     )''')
 
+    # One favorite per place: older versions allowed duplicates, keep the oldest row
+    c.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_favorites_user_place_unique'")
+    if not c.fetchone():
+        c.execute('''DELETE FROM favorites WHERE id NOT IN (
+            SELECT MIN(id) FROM favorites GROUP BY user_id, place_id)''')
+        c.execute('DROP INDEX IF EXISTS idx_favorites_user_place')
+        c.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_favorites_user_place_unique ON favorites (user_id, place_id)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_saved_routes_user ON saved_routes (user_id)')
+
+    c.execute('''CREATE TABLE IF NOT EXISTS idempotency_keys (
+        user_id INTEGER NOT NULL,
+        endpoint TEXT NOT NULL,
+        idem_key TEXT NOT NULL,
+        request_hash TEXT NOT NULL DEFAULT '',
+        status_code INTEGER NOT NULL,
+        response TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (user_id, endpoint, idem_key)
+    )''')
+    c.execute('PRAGMA table_info(idempotency_keys)')
+    if 'request_hash' not in {row[1] for row in c.fetchall()}:
+        c.execute("ALTER TABLE idempotency_keys ADD COLUMN request_hash TEXT NOT NULL DEFAULT ''")
+
+    c.execute('''CREATE TABLE IF NOT EXISTS jobs (
+        id TEXT PRIMARY KEY,
+        request_hash TEXT NOT NULL,
+        request TEXT NOT NULL,
+        status TEXT NOT NULL,
+        result TEXT,
+        error TEXT,
+        created_at REAL NOT NULL,
+        updated_at REAL NOT NULL
+    )''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_jobs_status_hash ON jobs (status, request_hash)')
+
+    # Full-text indexes over routes and favorites, kept in sync by triggers.
+    # A route's attractions are the distinct activity names inside route_data; clients
+    # may store any JSON there, so only objects are descended into and only text names kept.
+    c.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS saved_routes_fts USING fts5(
+        route_name, city, attractions, tokenize = 'unicode61 remove_diacritics 2'
+    )''')
+    c.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS favorites_fts USING fts5(
+        place_name, city, tokenize = 'unicode61 remove_diacritics 2'
+    )''')
+
+    route_attractions = '''(SELECT group_concat(name, ' ') FROM (
+        SELECT DISTINCT CASE WHEN activity.type = 'object' THEN
+            CASE WHEN json_type(activity.value, '$.name') = 'text' THEN json_extract(activity.value, '$.name') END
+        END AS name
+        FROM json_each(CASE WHEN json_valid(new.route_data) THEN new.route_data END, '$.itinerary') AS day,
+             json_each(CASE WHEN day.type = 'object' THEN day.value END, '$.activities') AS activity
+    ))'''
+    # Recreated on every start so databases holding older trigger versions pick up fixes
+    c.executescript(f'''
+        BEGIN IMMEDIATE;
+        DROP TRIGGER IF EXISTS saved_routes_fts_insert;
+        DROP TRIGGER IF EXISTS saved_routes_fts_update;
+        CREATE TRIGGER saved_routes_fts_insert AFTER INSERT ON saved_routes BEGIN
+            INSERT INTO saved_routes_fts (rowid, route_name, city, attractions)
+            VALUES (new.id, new.route_name, new.city, {route_attractions});
+        END;
+        CREATE TRIGGER saved_routes_fts_update AFTER UPDATE ON saved_routes BEGIN
+            DELETE FROM saved_routes_fts WHERE rowid = old.id;
+            INSERT INTO saved_routes_fts (rowid, route_name, city, attractions)
+            VALUES (new.id, new.route_name, new.city, {route_attractions});
+        END;
+        CREATE TRIGGER IF NOT EXISTS saved_routes_fts_delete AFTER DELETE ON saved_routes BEGIN
+            DELETE FROM saved_routes_fts WHERE rowid = old.id;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS favorites_fts_insert AFTER INSERT ON favorites BEGIN
+            INSERT INTO favorites_fts (rowid, place_name, city) VALUES (new.id, new.place_name, new.city);
+        END;
+        CREATE TRIGGER IF NOT EXISTS favorites_fts_update AFTER UPDATE ON favorites BEGIN
+            DELETE FROM favorites_fts WHERE rowid = old.id;
+            INSERT INTO favorites_fts (rowid, place_name, city) VALUES (new.id, new.place_name, new.city);
+        END;
+        CREATE TRIGGER IF NOT EXISTS favorites_fts_delete AFTER DELETE ON favorites BEGIN
+            DELETE FROM favorites_fts WHERE rowid = old.id;
+        END;
+        COMMIT;
+    ''')
+
+    # Index rows written before the triggers existed
+    c.execute(f'''INSERT INTO saved_routes_fts (rowid, route_name, city, attractions)
+                  SELECT new.id, new.route_name, new.city, {route_attractions}
+                  FROM saved_routes AS new
+                  WHERE new.id NOT IN (SELECT rowid FROM saved_routes_fts)''')
+    c.execute('''INSERT INTO favorites_fts (rowid, place_name, city)
+                 SELECT id, place_name, city FROM favorites
+                 WHERE id NOT IN (SELECT rowid FROM favorites_fts)''')
+
+    c.execute('''CREATE TABLE IF NOT EXISTS api_cache (
+        cache_key TEXT PRIMARY KEY,
+        value TEXT NOT NULL,
+        expires_at REAL NOT NULL
+    )''')
+
+    # Bytes on disk per photo cache directory, shared by every worker process
+    c.execute('''CREATE TABLE IF NOT EXISTS photo_cache_usage (
+        cache_dir TEXT PRIMARY KEY,
+        bytes INTEGER NOT NULL
+    )''')
+
+    conn.commit()
+
+_ready_dbs = set()
+_db_lock = threading.Lock()
+
+def ensure_db():
+    """Initialize the app's database once per process, on first use rather than at import"""
+    path = current_app.config['DATABASE']
+    if path in _ready_dbs:
+        return
+    with _db_lock:
+        if path not in _ready_dbs:
+            init_db()
+            _ready_dbs.add(path)
+
+# ==================== API CACHE ====================
+
+# Seconds each kind of upstream answer stays fresh in api_cache
+CACHE_TTL = {
+    'geocode': 30 * 24 * 3600,
+    'search': 24 * 3600,
+    'details': 24 * 3600,
+    'skeleton': 12 * 3600,
+}
+
+# Prefixed to every cache key; bump it when the shape of cached values changes
+CACHE_VERSION = 'v3'
+
+def cache_get(key):
+    """Return the cached value for key, or None if missing or expired"""
+    try:
+        conn = get_db()
+        c = conn.cursor()
+        c.execute('SELECT value FROM api_cache WHERE cache_key = ? AND expires_at > ?',
+                  (f"{CACHE_VERSION}:{key}", time.time()))
+        row = c.fetchone()
+        conn.close()
+        return json.loads(row[0]) if row else None
+    except Exception as e:
+        logger.error(f"Cache read error: {str(e)}")
+        return None
+
+def cache_set(key, value, ttl):
+    try:
+        conn = get_db()
+        c = conn.cursor()
+        c.execute('INSERT OR REPLACE INTO api_cache (cache_key, value, expires_at) VALUES (?, ?, ?)',
+                  (f"{CACHE_VERSION}:{key}", json.dumps(value), time.time() + ttl))
+        conn.commit()
+        conn.close()
+    except Exception as e:
+        logger.error(f"Cache write error: {str(e)}")
+
+def cache_prune():
+    """Delete expired entries, returns how many were removed"""
+    conn = get_db()
+    c = conn.cursor()
+    c.execute('DELETE FROM api_cache WHERE expires_at <= ?', (time.time(),))
+    removed = c.rowcount
     conn.commit()
     conn.close()
-    print("✅ Database initialized")
+    return removed
 
-init_db()
+def cache_expires_at(key):
+    """Expiry timestamp of a cache entry, or None if it does not exist"""
+    conn = get_db()
+    c = conn.cursor()
+    c.execute('SELECT expires_at FROM api_cache WHERE cache_key = ?', (f"{CACHE_VERSION}:{key}",))
+    row = c.fetchone()
+    conn.close()
+    return row[0] if row else None
+
+def city_key(city):
+    return ' '.join(city.split()).lower()
+
+class RateBudget:
+    """Token bucket limiting how many upstream Google calls this process makes per second"""
+
+    def __init__(self, rate, burst=None):
+        self.lock = threading.Lock()
+        self.set_rate(rate, burst)
+
+    def set_rate(self, rate, burst=None):
+        if not rate > 0:
+            raise ValueError(f"Upstream rate must be greater than 0, got {rate}")
+        with self.lock:
+            self.rate = rate
+            self.burst = burst or max(1.0, rate)
+            self.tokens = self.burst
+            self.updated = time.monotonic()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+# create_app() applies the configured UPSTREAM_QPS
+upstream_budget = RateBudget(10)
 
 # ==================== DECORATORS ====================
 
+@api.before_app_request
+def before_request():
+    # Liveness and readiness probes must answer even when the database is unusable
+    if request.endpoint in ('api.health_check', 'api.readiness_check'):
+        return
+    ensure_db()
+
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
@@ -103,7 +310,7 @@ def token_required(f):
             return jsonify({'error': 'Token is missing'}), 401
 
         try:
-            data = jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
+            data = jwt.decode(token, current_app.config['JWT_SECRET'], algorithms=["HS256"])
             current_user_id = data['user_id']
         except jwt.ExpiredSignatureError:
             return jsonify({'error': 'Token has expired'}), 401
@@ -120,7 +327,7 @@ def token_required(f):
 def admin_required(f):
     @wraps(f)
     def decorated(current_user_id, *args, **kwargs):
-        conn = sqlite3.connect('travelguide.db')
+        conn = get_db()
         c = conn.cursor()
         c.execute('SELECT is_admin FROM users WHERE id = ?', (current_user_id,))
         result = c.fetchone()
@@ -135,15 +342,48 @@ def admin_required(f):
 
 # ==================== HELPER FUNCTIONS ====================
 
-def get_place_details(place_id):
+_gmaps_lock = threading.Lock()
+
+def get_gmaps():
+    """googlemaps.Client for the current app, built (and imported) on first use"""
+    client = current_app.extensions.get('gmaps')
+    if client is None:
+        with _gmaps_lock:
+            client = current_app.extensions.get('gmaps')
+            if client is None:
+                import googlemaps
+
+                api_key = current_app.config['GOOGLE_API_KEY']
+                if not api_key:
+                    raise RuntimeError('GOOGLE_API_KEY not set')
+                # The client defaults to no socket timeout and 60s of retries; bound both so a
+                # hung geocode cannot outlive the itinerary deadline
+                client = googlemaps.Client(
+                    key=api_key,
+                    timeout=10,
+                    retry_timeout=min(60, current_app.config['ITINERARY_DEADLINE_SECONDS'])
+                )
+                current_app.extensions['gmaps'] = client
+    return client
+
+def get_place_details(place_id, refresh=False):
+    cache_key = f"details:{place_id}"
+    if not refresh:
+        cached = cache_get(cache_key)
+        if cached:
+            return cached
+
     try:
+        import requests
+
         url = "https://maps.googleapis.com/maps/api/place/details/json"
         params = {
             'place_id': place_id,
-            'key': GOOGLE_API_KEY,
+            'key': current_app.config['GOOGLE_API_KEY'],
             'fields': 'name,rating,reviews,formatted_address,opening_hours,formatted_phone_number,website,photos,types,price_level,user_ratings_total,geometry'
         }
 
+        upstream_budget.acquire()
         response = requests.get(url, params=params, timeout=10)
         result = response.json()
 
@@ -155,8 +395,7 @@ def get_place_details(place_id):
                 for photo in place['photos'][:3]:
                     photo_ref = photo.get('photo_reference')
                     if photo_ref:
-                        photo_url = f"https://maps.googleapis.com/maps/api/place/photo?maxwidth=800&photoreference={photo_ref}&key={GOOGLE_API_KEY}"
-                        photos.append(photo_url)
+                        photos.append(f"/api/photo/{photo_ref}?size=large&sig={photo_signature(photo_ref)}")
 
             reviews = []
             if 'reviews' in place:
@@ -172,7 +411,7 @@ def get_place_details(place_id):
             if 'opening_hours' in place and 'weekday_text' in place['opening_hours']:
                 opening_hours = place['opening_hours']['weekday_text']
 
-            return {
+            details = {
                 'name': place.get('name', ''),
                 'rating': place.get('rating', 'N/A'),
                 'user_ratings_total': place.get('user_ratings_total', 0),
@@ -189,24 +428,37 @@ def get_place_details(place_id):
                     'lng': place.get('geometry', {}).get('location', {}).get('lng')
                 }
             }
+            cache_set(cache_key, details, CACHE_TTL['details'])
+            return details
 
         return None
     except Exception as e:
         logger.error(f"Error in get_place_details: {str(e)}")
         return None
 
-def text_search_places(query, location=None):
+def text_search_places(query, location=None, place_type=None, refresh=False):
+    cache_key = f"search:{query.lower()}|{location or ''}|{place_type or ''}"
+    if not refresh:
+        cached = cache_get(cache_key)
+        if cached is not None:
+            return cached
+
     try:
+        import requests
+
         url = "https://maps.googleapis.com/maps/api/place/textsearch/json"
         params = {
             'query': query,
-            'key': GOOGLE_API_KEY
+            'key': current_app.config['GOOGLE_API_KEY']
         }
 
         if location:
             params['location'] = location
-            params['radius'] = 10000
+            params['radius'] = SEARCH_RADIUS_M
+        if place_type:
+            params['type'] = place_type
 
+        upstream_budget.acquire()
         response = requests.get(url, params=params, timeout=10)
         result = response.json()
 
@@ -217,6 +469,7 @@ def text_search_places(query, location=None):
                     'place_id': place.get('place_id'),
                     'name': place.get('name'),
                     'rating': place.get('rating', 'N/A'),
+                    'user_ratings_total': place.get('user_ratings_total', 0),
                     'formatted_address': place.get('formatted_address', ''),
                     'types': place.get('types', []),
                     'location': {
@@ -225,29 +478,249 @@ def text_search_places(query, location=None):
                     }
                 })
 
+        if result['status'] in ('OK', 'ZERO_RESULTS'):
+            cache_set(cache_key, places, CACHE_TTL['search'])
         return places
     except Exception as e:
         logger.error(f"Error in text_search_places: {str(e)}")
         return []
 
-def geocode_address(address):
+def geocode_address(address, refresh=False):
+    cache_key = f"geocode:{city_key(address)}"
+    if not refresh:
+        cached = cache_get(cache_key)
+        if cached:
+            return cached
+
     try:
-        result = gmaps.geocode(address)
+        upstream_budget.acquire()
+        result = get_gmaps().geocode(address)
         if result:
             location = result[0]['geometry']['location']
-            return {
+            geocode = {
                 'lat': location['lat'],
                 'lng': location['lng'],
                 'formatted_address': result[0]['formatted_address']
             }
+            cache_set(cache_key, geocode, CACHE_TTL['geocode'])
+            return geocode
         return None
     except Exception as e:
         logger.error(f"Error in geocode: {str(e)}")
         return None
 
+# ==================== ITINERARY RANKING ====================
+
+SEARCH_RADIUS_M = 10000
+MAX_ATTRACTIONS = 15
+
+# What each interest searches for and which Google place types count as a match
+INTEREST_PROFILES = {
+    'sightseeing': {
+        'searches': [('tourist attractions in {city}', None), ('things to do in {city}', None)],
+        'types': {'tourist_attraction', 'point_of_interest', 'museum', 'park', 'church'},
+        'category': 'Sightseeing',
+        'duration': '2h'
+    },
+    'history': {
+        'searches': [('historical landmarks in {city}', None), ('museums in {city}', 'museum')],
+        'types': {'museum', 'church', 'place_of_worship', 'synagogue', 'mosque', 'hindu_temple', 'city_hall', 'cemetery'},
+        'category': 'History',
+        'duration': '2h'
+    },
+    'nature': {
+        'searches': [('parks and gardens in {city}', 'park'), ('nature spots near {city}', None)],
+        'types': {'park', 'natural_feature', 'zoo', 'aquarium', 'campground'},
+        'category': 'Nature',
+        'duration': '2h'
+    },
+    'food': {
+        'searches': [('best local restaurants in {city}', 'restaurant'), ('food markets in {city}', None)],
+        'types': {'restaurant', 'cafe', 'bakery', 'food', 'meal_takeaway', 'supermarket'},
+        'category': 'Food',
+        'duration': '1.5h'
+    },
+    'shopping': {
+        'searches': [('shopping streets in {city}', None), ('shopping malls in {city}', 'shopping_mall')],
+        'types': {'shopping_mall', 'store', 'clothing_store', 'department_store', 'book_store', 'jewelry_store'},
+        'category': 'Shopping',
+        'duration': '2h'
+    },
+    'nightlife': {
+        'searches': [('best bars in {city}', 'bar'), ('nightlife in {city}', 'night_club')],
+        'types': {'bar', 'night_club', 'casino'},
+        'category': 'Nightlife',
+        'duration': '3h'
+    },
+    'adventure': {
+        'searches': [('outdoor activities in {city}', None), ('amusement parks in {city}', 'amusement_park')],
+        'types': {'amusement_park', 'stadium', 'campground', 'bowling_alley', 'gym', 'aquarium'},
+        'category': 'Adventure',
+        'duration': '3h'
+    },
+}
+
+RANKING_WEIGHTS = {
+    'rating': 0.35,
+    'popularity': 0.25,
+    'type_match': 0.25,
+    'distance': 0.15,
+}
+
+# Ratings are pulled towards this prior until a place has this many reviews
+RATING_PRIOR = 4.0
+RATING_PRIOR_REVIEWS = 50
+
+def normalize_interests(interests):
+    """Known interests, lower-cased, de-duplicated and sorted; sightseeing when none are given"""
+    known = sorted({str(i).strip().lower() for i in interests or []} & set(INTEREST_PROFILES))
+    return known or ['sightseeing']
+
+def skeleton_key(city, interests=None):
+    return f"skeleton:{city_key(city)}|{','.join(normalize_interests(interests))}"
+
+class DeadlineExceeded(Exception):
+    pass
+
+def check_deadline(deadline):
+    if deadline is not None and time.monotonic() >= deadline:
+        raise DeadlineExceeded('Itinerary generation took too long')
+
+def fan_out(fn, calls, deadline=None):
+    """Run fn(*args) for every args tuple in parallel inside the current app context, keeping order.
+
+    With a deadline (a time.monotonic() value) it stops waiting once the deadline
+    passes and raises DeadlineExceeded; calls already in flight end on their own timeouts.
+    """
+    if not calls:
+        return []
+    check_deadline(deadline)
+    app = current_app._get_current_object()
+
+    def run(args):
+        with app.app_context():
+            return fn(*args)
+
+    pool = ThreadPoolExecutor(max_workers=min(len(calls), 8))
+    try:
+        timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+        return list(pool.map(run, calls, timeout=timeout))
+    except FuturesTimeout:
+        raise DeadlineExceeded('Itinerary generation took too long')
+    finally:
+        pool.shutdown(wait=deadline is None, cancel_futures=True)
+
+def retrieve_candidates(city, location, interests, refresh=False, deadline=None):
+    """Run every search for the interests and merge the results by place_id"""
+    searches = []
+    for interest in interests:
+        for query, place_type in INTEREST_PROFILES[interest]['searches']:
+            searches.append((interest, query.format(city=city), place_type))
+
+    results = fan_out(text_search_places, [(query, location, place_type, refresh) for _, query, place_type in searches],
+                      deadline=deadline)
+
+    candidates = {}
+    for (interest, _, _), places in zip(searches, results):
+        for place in places:
+            if not place.get('place_id'):
+                continue
+            candidate = candidates.setdefault(place['place_id'], dict(place, found_by=interest))
+            candidate['hits'] = candidate.get('hits', 0) + 1
+    return list(candidates.values())
+
+def distance_km(a, b):
+    lat1, lng1, lat2, lng2 = map(math.radians, (a['lat'], a['lng'], b['lat'], b['lng']))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 12742 * math.asin(math.sqrt(h))
+
+def score_candidates(candidates, center, interests):
+    """Score every candidate in one pass per feature column; higher is better"""
+    wanted_types = set().union(*(INTEREST_PROFILES[i]['types'] for i in interests))
+    ratings = [c['rating'] if isinstance(c.get('rating'), (int, float)) else 0.0 for c in candidates]
+    reviews = [c.get('user_ratings_total') or 0 for c in candidates]
+
+    adjusted = [(r * n + RATING_PRIOR * RATING_PRIOR_REVIEWS) / (n + RATING_PRIOR_REVIEWS)
+                for r, n in zip(ratings, reviews)]
+    max_log_reviews = math.log1p(max(reviews, default=0)) or 1.0
+    popularity = [math.log1p(n) / max_log_reviews for n in reviews]
+    type_match = [min(1.0, len(wanted_types.intersection(c.get('types', []))) / 2) for c in candidates]
+    radius_km = SEARCH_RADIUS_M / 1000
+    distance = [
+        max(0.0, 1 - distance_km(center, c['location']) / radius_km)
+        if c.get('location', {}).get('lat') is not None else 0.0
+        for c in candidates
+    ]
+
+    w = RANKING_WEIGHTS
+    return [
+        w['rating'] * (r / 5) + w['popularity'] * p + w['type_match'] * t + w['distance'] * d
+        for r, p, t, d in zip(adjusted, popularity, type_match, distance)
+    ]
+
+def candidate_interest(candidate, interests):
+    """First selected interest whose types the place has, else the interest whose search found it"""
+    types = set(candidate.get('types', []))
+    for interest in interests:
+        if types & INTEREST_PROFILES[interest]['types']:
+            return interest
+    return candidate['found_by']
+
+def build_city_skeleton(city, interests=None, refresh=False, deadline=None):
+    """Geocode a city and pick its best attractions for the interests, cached per city and interests"""
+    interests = normalize_interests(interests)
+    cache_key = skeleton_key(city, interests)
+    if not refresh:
+        cached = cache_get(cache_key)
+        if cached:
+            return cached
+
+    check_deadline(deadline)
+    geocode_result = geocode_address(city, refresh=refresh)
+    if not geocode_result:
+        return None
+
+    location = f"{geocode_result['lat']},{geocode_result['lng']}"
+    candidates = retrieve_candidates(city, location, interests, refresh=refresh, deadline=deadline)
+    scores = score_candidates(candidates, geocode_result, interests)
+    ranked = [c for _, c in sorted(zip(scores, candidates), key=lambda pair: pair[0], reverse=True)]
+
+    # Only the top-K candidates cost a Place Details call
+    top = ranked[:MAX_ATTRACTIONS]
+    details_list = fan_out(get_place_details, [(c['place_id'], refresh) for c in top], deadline=deadline)
+
+    all_attractions = []
+    for candidate, details in zip(top, details_list):
+        if not details:
+            continue
+        profile = INTEREST_PROFILES[candidate_interest(candidate, interests)]
+        all_attractions.append({
+            'name': details['name'],
+            'category': profile['category'],
+            'description': f"Popular attraction with {details['user_ratings_total']} reviews",
+            'address': details['formatted_address'],
+            'rating': details['rating'],
+            'phone': details['phone'],
+            'website': details['website'],
+            'opening_hours': details['opening_hours'],
+            'photos': details['photos'],
+            'reviews': details['reviews'],
+            'duration': profile['duration'],
+            'place_id': candidate['place_id']
+        })
+
+    skeleton = {
+        'geocode': geocode_result,
+        'interests': interests,
+        'attractions': all_attractions
+    }
+    if all_attractions:
+        cache_set(cache_key, skeleton, CACHE_TTL['skeleton'])
+    return skeleton
+
 # ==================== AUTH ENDPOINTS ====================
 
-@app.route('/api/register', methods=['POST'])
+@api.route('/api/register', methods=['POST'])
 def register():
     try:
         data = request.json
@@ -263,7 +736,7 @@ def register():
 
         password_hash = generate_password_hash(password)
 
-        conn = sqlite3.connect('travelguide.db')
+        conn = get_db()
         c = conn.cursor()
 
         try:
@@ -282,7 +755,7 @@ def register():
             token = jwt.encode({
                 'user_id': user_id,
                 'exp': datetime.utcnow() + timedelta(days=30)
-            }, JWT_SECRET, algorithm='HS256')
+            }, current_app.config['JWT_SECRET'], algorithm='HS256')
 
             return jsonify({
                 'message': 'User registered successfully',
@@ -302,7 +775,7 @@ def register():
         logger.error(f"Register error: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/login', methods=['POST'])
+@api.route('/api/login', methods=['POST'])
 def login():
     try:
         data = request.json
@@ -312,7 +785,7 @@ def login():
         if not username or not password:
             return jsonify({'error': 'Username and password required'}), 400
 
-        conn = sqlite3.connect('travelguide.db')
+        conn = get_db()
         c = conn.cursor()
         c.execute('SELECT id, username, email, password_hash, is_admin FROM users WHERE username = ?', (username,))
         user = c.fetchone()
@@ -324,7 +797,7 @@ def login():
         token = jwt.encode({
             'user_id': user[0],
             'exp': datetime.utcnow() + timedelta(days=30)
-        }, JWT_SECRET, algorithm='HS256')
+        }, current_app.config['JWT_SECRET'], algorithm='HS256')
 
         return jsonify({
             'message': 'Login successful',
@@ -341,11 +814,11 @@ def login():
         logger.error(f"Login error: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/profile', methods=['GET'])
+@api.route('/api/profile', methods=['GET'])
 @token_required
 def get_profile(current_user_id):
     try:
-        conn = sqlite3.connect('travelguide.db')
+        conn = get_db()
         c = conn.cursor()
         c.execute('SELECT id, username, email, is_admin, created_at FROM users WHERE id = ?', (current_user_id,))
         user = c.fetchone()
@@ -380,12 +853,12 @@ def get_profile(current_user_id):
 
 # ==================== ADMIN ENDPOINTS ====================
 
-@app.route('/api/admin/users', methods=['GET'])
+@api.route('/api/admin/users', methods=['GET'])
 @token_required
 @admin_required
 def get_all_users(current_user_id):
     try:
-        conn = sqlite3.connect('travelguide.db')
+        conn = get_db()
         c = conn.cursor()
         c.execute('SELECT id, username, email, is_admin, created_at FROM users ORDER BY created_at DESC')
         users = c.fetchall()
@@ -407,7 +880,7 @@ def get_all_users(current_user_id):
         logger.error(f"Get users error: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/admin/users/<int:user_id>', methods=['DELETE'])
+@api.route('/api/admin/users/<int:user_id>', methods=['DELETE'])
 @token_required
 @admin_required
 def delete_user(current_user_id, user_id):
@@ -415,10 +888,11 @@ def delete_user(current_user_id, user_id):
         if current_user_id == user_id:
             return jsonify({'error': 'Cannot delete yourself'}), 400
 
-        conn = sqlite3.connect('travelguide.db')
+        conn = get_db()
         c = conn.cursor()
         c.execute('DELETE FROM saved_routes WHERE user_id = ?', (user_id,))
         c.execute('DELETE FROM favorites WHERE user_id = ?', (user_id,))
+        c.execute('DELETE FROM idempotency_keys WHERE user_id = ?', (user_id,))
         c.execute('DELETE FROM users WHERE id = ?', (user_id,))
         conn.commit()
         conn.close()
@@ -429,12 +903,12 @@ def delete_user(current_user_id, user_id):
         logger.error(f"Delete user error: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/admin/all-routes', methods=['GET'])
+@api.route('/api/admin/all-routes', methods=['GET'])
 @token_required
 @admin_required
 def get_all_routes(current_user_id):
     try:
-        conn = sqlite3.connect('travelguide.db')
+        conn = get_db()
         c = conn.cursor()
 
         c.execute('''
@@ -468,12 +942,12 @@ def get_all_routes(current_user_id):
         logger.error(f"Get all routes error: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/admin/routes/<int:route_id>', methods=['DELETE'])
+@api.route('/api/admin/routes/<int:route_id>', methods=['DELETE'])
 @token_required
 @admin_required
 def delete_route_admin(current_user_id, route_id):
     try:
-        conn = sqlite3.connect('travelguide.db')
+        conn = get_db()
         c = conn.cursor()
         c.execute('DELETE FROM saved_routes WHERE id = ?', (route_id,))
         conn.commit()
@@ -485,12 +959,12 @@ def delete_route_admin(current_user_id, route_id):
         logger.error(f"Delete route error: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/admin/stats', methods=['GET'])
+@api.route('/api/admin/stats', methods=['GET'])
 @token_required
 @admin_required
 def get_stats(current_user_id):
     try:
-        conn = sqlite3.connect('travelguide.db')
+        conn = get_db()
         c = conn.cursor()
 
         c.execute('SELECT COUNT(*) FROM users')
@@ -522,12 +996,12 @@ def get_stats(current_user_id):
 
 # ==================== ROUTES ENDPOINTS ====================
 
-@app.route('/api/routes', methods=['GET'])
+@api.route('/api/routes', methods=['GET'])
 @token_required
 def get_saved_routes(current_user_id):
     """Get user's saved routes"""
     try:
-        conn = sqlite3.connect('travelguide.db')
+        conn = get_db()
         c = conn.cursor()
         c.execute('''SELECT id, route_name, city, route_data, created_at 
                      FROM saved_routes WHERE user_id = ? ORDER BY created_at DESC''',
@@ -551,7 +1025,7 @@ def get_saved_routes(current_user_id):
         logger.error(f"Get routes error: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/routes', methods=['POST'])
+@api.route('/api/routes', methods=['POST'])
 @token_required
 def save_route(current_user_id):
     """Save a new route"""
@@ -564,7 +1038,7 @@ def save_route(current_user_id):
         if not route_name or not city or not route_data:
             return jsonify({'error': 'All fields are required'}), 400
 
-        conn = sqlite3.connect('travelguide.db')
+        conn = get_db()
         c = conn.cursor()
         c.execute('''INSERT INTO saved_routes (user_id, route_name, city, route_data) 
                      VALUES (?, ?, ?, ?)''',
@@ -582,12 +1056,12 @@ def save_route(current_user_id):
         logger.error(f"Save route error: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/routes/<int:route_id>', methods=['DELETE'])
+@api.route('/api/routes/<int:route_id>', methods=['DELETE'])
 @token_required
 def delete_route(current_user_id, route_id):
     """Delete a saved route"""
     try:
-        conn = sqlite3.connect('travelguide.db')
+        conn = get_db()
         c = conn.cursor()
         c.execute('DELETE FROM saved_routes WHERE id = ? AND user_id = ?', (route_id, current_user_id))
         conn.commit()
@@ -601,12 +1075,12 @@ def delete_route(current_user_id, route_id):
 
 # ==================== FAVORITES ENDPOINTS ====================
 
-@app.route('/api/favorites', methods=['GET'])
+@api.route('/api/favorites', methods=['GET'])
 @token_required
 def get_favorites(current_user_id):
     """Get user's favorite places"""
     try:
-        conn = sqlite3.connect('travelguide.db')
+        conn = get_db()
         c = conn.cursor()
         c.execute('''SELECT id, place_id, place_name, city, created_at 
                      FROM favorites WHERE user_id = ? ORDER BY created_at DESC''',
@@ -630,7 +1104,7 @@ def get_favorites(current_user_id):
         logger.error(f"Get favorites error: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/favorites', methods=['POST'])
+@api.route('/api/favorites', methods=['POST'])
 @token_required
 def add_favorite(current_user_id):
     """Add place to favorites"""
@@ -643,15 +1117,23 @@ def add_favorite(current_user_id):
         if not place_id or not place_name or not city:
             return jsonify({'error': 'All fields are required'}), 400
 
-        conn = sqlite3.connect('travelguide.db')
+        conn = get_db()
         c = conn.cursor()
         c.execute('''INSERT INTO favorites (user_id, place_id, place_name, city) 
-                     VALUES (?, ?, ?, ?)''',
+                     VALUES (?, ?, ?, ?)
+                     ON CONFLICT (user_id, place_id) DO NOTHING''',
                   (current_user_id, place_id, place_name, city))
+        added = c.rowcount == 1
         conn.commit()
-        fav_id = c.lastrowid
+        fav_id = favorite_ids_by_place(c, current_user_id, [place_id])[place_id]
         conn.close()
 
+        if not added:
+            return jsonify({
+                'message': 'Already in favorites',
+                'favorite_id': fav_id
+            }), 200
+
         return jsonify({
             'message': 'Added to favorites',
             'favorite_id': fav_id
@@ -661,12 +1143,12 @@ def add_favorite(current_user_id):
         logger.error(f"Add favorite error: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/favorites/<int:fav_id>', methods=['DELETE'])
+@api.route('/api/favorites/<int:fav_id>', methods=['DELETE'])
 @token_required
 def delete_favorite(current_user_id, fav_id):
     """Remove from favorites"""
     try:
-        conn = sqlite3.connect('travelguide.db')
+        conn = get_db()
         c = conn.cursor()
         c.execute('DELETE FROM favorites WHERE id = ? AND user_id = ?', (fav_id, current_user_id))
         conn.commit()
@@ -679,9 +1161,631 @@ def delete_favorite(current_user_id, fav_id):
         return jsonify({'error': str(e)}), 500
 
 
+# ==================== BATCH ENDPOINTS ====================
+
+MAX_BATCH_ITEMS = 500
+
+def run_batch(current_user_id, endpoint, handler):
+    """Run handler(cursor) in one write transaction.
+
+    A repeated Idempotency-Key header for the same user and endpoint replays
+    the stored response instead of applying the batch a second time. Reusing
+    a key with a different request body is rejected with 422.
+    """
+    idem_key = request.headers.get('Idempotency-Key')
+    request_hash = hashlib.sha256(
+        json.dumps(request.get_json(silent=True), sort_keys=True).encode()).hexdigest()
+
+    conn = get_db()
+    conn.isolation_level = None
+    c = conn.cursor()
+    try:
+        c.execute('BEGIN IMMEDIATE')
+
+        if idem_key:
+            c.execute('''SELECT status_code, response, request_hash FROM idempotency_keys
+                         WHERE user_id = ? AND endpoint = ? AND idem_key = ?''',
+                      (current_user_id, endpoint, idem_key))
+            stored = c.fetchone()
+            if stored:
+                c.execute('ROLLBACK')
+                if stored[2] != request_hash:
+                    return jsonify({'error': 'Idempotency-Key was already used with a different request'}), 422
+                response = jsonify(json.loads(stored[1]))
+                response.headers['Idempotent-Replayed'] = 'true'
+                return response, stored[0]
+
+        body, status_code = handler(c)
+
+        if idem_key:
+            c.execute('''DELETE FROM idempotency_keys
+                         WHERE user_id = ? AND created_at < datetime('now', '-1 day')''',
+                      (current_user_id,))
+            c.execute('''INSERT INTO idempotency_keys (user_id, endpoint, idem_key, request_hash, status_code, response)
+                         VALUES (?, ?, ?, ?, ?, ?)''',
+                      (current_user_id, endpoint, idem_key, request_hash, status_code, json.dumps(body)))
+
+        c.execute('COMMIT')
+        return jsonify(body), status_code
+    except Exception:
+        if conn.in_transaction:
+            c.execute('ROLLBACK')
+        raise
+    finally:
+        conn.close()
+
+def batch_items(data, field):
+    """Return data[field] as a list, or an error message if it is not a usable batch"""
+    items = data.get(field, [])
+    if not isinstance(items, list):
+        return None, f'{field} must be a list'
+    if len(items) > MAX_BATCH_ITEMS:
+        return None, f'At most {MAX_BATCH_ITEMS} items per batch'
+    return items, None
+
+def is_row_id(value):
+    """Integer ids only; JSON true/false would otherwise pass as 1 and 0"""
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def is_text(value):
+    return isinstance(value, str) and value != ''
+
+def valid_favorite(item):
+    return isinstance(item, dict) and all(is_text(item.get(field)) for field in ('place_id', 'place_name', 'city'))
+
+def valid_route(item):
+    return (isinstance(item, dict) and is_text(item.get('route_name')) and is_text(item.get('city'))
+            and bool(item.get('route_data')))
+
+def favorite_ids_by_place(c, current_user_id, place_ids):
+    if not place_ids:
+        return {}
+    placeholders = ','.join('?' * len(place_ids))
+    c.execute(f'SELECT place_id, id FROM favorites WHERE user_id = ? AND place_id IN ({placeholders})',
+              (current_user_id, *place_ids))
+    return dict(c.fetchall())
+
+def add_favorites(c, current_user_id, items):
+    """Insert new favorites with one executemany, returns per-item results"""
+    results = []
+    valid = []
+    for index, item in enumerate(items):
+        if not valid_favorite(item):
+            results.append({'index': index, 'status': 'invalid', 'error': 'place_id, place_name and city are required'})
+        else:
+            results.append({'index': index, 'place_id': item['place_id']})
+            valid.append(item)
+
+    existing = favorite_ids_by_place(c, current_user_id, list({item['place_id'] for item in valid}))
+    new_rows = {}
+    for item in valid:
+        if item['place_id'] not in existing:
+            new_rows.setdefault(item['place_id'], (current_user_id, item['place_id'], item['place_name'], item['city']))
+
+    c.executemany('''INSERT INTO favorites (user_id, place_id, place_name, city) VALUES (?, ?, ?, ?)
+                     ON CONFLICT (user_id, place_id) DO NOTHING''',
+                  list(new_rows.values()))
+    ids = favorite_ids_by_place(c, current_user_id, list(new_rows))
+
+    for result in results:
+        if 'place_id' in result:
+            if result['place_id'] in new_rows:
+                result['status'] = 'added'
+                new_rows.pop(result['place_id'])
+            else:
+                result['status'] = 'exists'
+            result['favorite_id'] = existing.get(result['place_id']) or ids[result['place_id']]
+
+    return results
+
+def remove_favorites(c, current_user_id, items):
+    """Delete favorites given as {"id": ...} or {"place_id": ...}, returns per-item results"""
+    ids = [item['id'] for item in items if isinstance(item, dict) and is_row_id(item.get('id'))]
+    by_place = favorite_ids_by_place(
+        c, current_user_id, list({item['place_id'] for item in items if isinstance(item, dict) and is_text(item.get('place_id'))}))
+    found_ids = set()
+    if ids:
+        placeholders = ','.join('?' * len(ids))
+        c.execute(f'SELECT id FROM favorites WHERE user_id = ? AND id IN ({placeholders})', (current_user_id, *ids))
+        found_ids = {row[0] for row in c.fetchall()}
+
+    results = []
+    for index, item in enumerate(items):
+        if isinstance(item, dict) and is_row_id(item.get('id')):
+            found = item['id'] in found_ids
+            results.append({'index': index, 'id': item['id'], 'status': 'removed' if found else 'not_found'})
+        elif isinstance(item, dict) and is_text(item.get('place_id')):
+            found = item['place_id'] in by_place
+            results.append({'index': index, 'place_id': item['place_id'], 'status': 'removed' if found else 'not_found'})
+        else:
+            results.append({'index': index, 'status': 'invalid', 'error': 'id or place_id is required'})
+
+    c.executemany('DELETE FROM favorites WHERE id = ? AND user_id = ?',
+                  [(fav_id, current_user_id) for fav_id in found_ids])
+    c.executemany('DELETE FROM favorites WHERE user_id = ? AND place_id = ?',
+                  [(current_user_id, place_id) for place_id in by_place])
+    return results
+
+def add_routes(c, current_user_id, items):
+    """Insert new routes with one executemany, returns per-item results"""
+    results = []
+    rows = []
+    for index, item in enumerate(items):
+        if not valid_route(item):
+            results.append({'index': index, 'status': 'invalid', 'error': 'route_name, city and route_data are required'})
+        else:
+            results.append({'index': index, 'status': 'added'})
+            rows.append((current_user_id, item['route_name'], item['city'], json.dumps(item['route_data'])))
+
+    c.executemany('INSERT INTO saved_routes (user_id, route_name, city, route_data) VALUES (?, ?, ?, ?)', rows)
+
+    # The write lock is held for the whole transaction, so the new AUTOINCREMENT ids are consecutive
+    c.execute('SELECT last_insert_rowid()')
+    next_id = c.fetchone()[0] - len(rows) + 1
+    for result in results:
+        if result['status'] == 'added':
+            result['route_id'] = next_id
+            next_id += 1
+    return results
+
+def remove_routes(c, current_user_id, items):
+    """Delete routes by id, returns per-item results"""
+    ids = [route_id for route_id in items if is_row_id(route_id)]
+    found_ids = set()
+    if ids:
+        placeholders = ','.join('?' * len(ids))
+        c.execute(f'SELECT id FROM saved_routes WHERE user_id = ? AND id IN ({placeholders})', (current_user_id, *ids))
+        found_ids = {row[0] for row in c.fetchall()}
+
+    results = []
+    for index, route_id in enumerate(items):
+        if not is_row_id(route_id):
+            results.append({'index': index, 'status': 'invalid', 'error': 'Route ids must be integers'})
+        else:
+            results.append({'index': index, 'route_id': route_id, 'status': 'removed' if route_id in found_ids else 'not_found'})
+
+    c.executemany('DELETE FROM saved_routes WHERE id = ? AND user_id = ?',
+                  [(route_id, current_user_id) for route_id in found_ids])
+    return results
+
+@api.route('/api/favorites/batch', methods=['POST'])
+@token_required
+def batch_favorites(current_user_id):
+    """Add and remove many favorites in one transaction"""
+    try:
+        data = request.get_json(silent=True) or {}
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Request body must be a JSON object'}), 400
+        to_add, error = batch_items(data, 'add')
+        if error:
+            return jsonify({'error': error}), 400
+        to_remove, error = batch_items(data, 'remove')
+        if error:
+            return jsonify({'error': error}), 400
+
+        def handler(c):
+            removed = remove_favorites(c, current_user_id, to_remove)
+            added = add_favorites(c, current_user_id, to_add)
+            return {'added': added, 'removed': removed}, 200
+
+        return run_batch(current_user_id, 'favorites/batch', handler)
+
+    except Exception as e:
+        logger.error(f"Batch favorites error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/favorites/sync', methods=['PUT'])
+@token_required
+def sync_favorites(current_user_id):
+    """Make the user's favorites exactly the given list, matched by place_id"""
+    try:
+        data = request.get_json(silent=True) or {}
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Request body must be a JSON object'}), 400
+        desired, error = batch_items(data, 'favorites')
+        if error:
+            return jsonify({'error': error}), 400
+
+        def handler(c):
+            wanted = {item['place_id'] for item in desired if isinstance(item, dict) and is_text(item.get('place_id'))}
+            c.execute('SELECT id, place_id FROM favorites WHERE user_id = ?', (current_user_id,))
+            stale = [{'id': fav_id} for fav_id, place_id in c.fetchall() if place_id not in wanted]
+
+            removed = remove_favorites(c, current_user_id, stale)
+            added = add_favorites(c, current_user_id, desired)
+            return {'added': added, 'removed': removed}, 200
+
+        return run_batch(current_user_id, 'favorites/sync', handler)
+
+    except Exception as e:
+        logger.error(f"Sync favorites error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/favorites/check', methods=['POST'])
+@token_required
+def check_favorites(current_user_id):
+    """Which of the given place_ids the user has favorited, mapped to their favorite ids"""
+    try:
+        data = request.get_json(silent=True) or {}
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Request body must be a JSON object'}), 400
+        place_ids, error = batch_items(data, 'place_ids')
+        if error:
+            return jsonify({'error': error}), 400
+        if not all(isinstance(place_id, str) for place_id in place_ids):
+            return jsonify({'error': 'place_ids must be strings'}), 400
+
+        conn = get_db()
+        c = conn.cursor()
+        favorited = favorite_ids_by_place(c, current_user_id, list(set(place_ids)))
+        conn.close()
+
+        return jsonify({
+            'favorites': {place_id: favorited.get(place_id) for place_id in place_ids}
+        }), 200
+
+    except Exception as e:
+        logger.error(f"Check favorites error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/routes/batch', methods=['POST'])
+@token_required
+def batch_routes(current_user_id):
+    """Save and delete many routes in one transaction"""
+    try:
+        data = request.get_json(silent=True) or {}
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Request body must be a JSON object'}), 400
+        to_add, error = batch_items(data, 'add')
+        if error:
+            return jsonify({'error': error}), 400
+        to_remove, error = batch_items(data, 'remove')
+        if error:
+            return jsonify({'error': error}), 400
+
+        def handler(c):
+            removed = remove_routes(c, current_user_id, to_remove)
+            added = add_routes(c, current_user_id, to_add)
+            return {'added': added, 'removed': removed}, 200
+
+        return run_batch(current_user_id, 'routes/batch', handler)
+
+    except Exception as e:
+        logger.error(f"Batch routes error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/routes/sync', methods=['PUT'])
+@token_required
+def sync_routes(current_user_id):
+    """Make the user's routes exactly the given list.
+
+    Items with an id update that route, items without one are created and
+    routes missing from the list are deleted.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Request body must be a JSON object'}), 400
+        desired, error = batch_items(data, 'routes')
+        if error:
+            return jsonify({'error': error}), 400
+
+        def handler(c):
+            c.execute('SELECT id FROM saved_routes WHERE user_id = ?', (current_user_id,))
+            owned = {row[0] for row in c.fetchall()}
+
+            updated = []
+            updates = []
+            new_items = []
+            new_indexes = []
+            for index, item in enumerate(desired):
+                if not valid_route(item):
+                    updated.append({'index': index, 'status': 'invalid', 'error': 'route_name, city and route_data are required'})
+                elif 'id' not in item:
+                    new_items.append(item)
+                    new_indexes.append(index)
+                elif not is_row_id(item['id']):
+                    updated.append({'index': index, 'status': 'invalid', 'error': 'Route ids must be integers'})
+                elif item['id'] in owned:
+                    updates.append((item['route_name'], item['city'], json.dumps(item['route_data']), item['id'], current_user_id))
+                    updated.append({'index': index, 'route_id': item['id'], 'status': 'updated'})
+                else:
+                    updated.append({'index': index, 'route_id': item['id'], 'status': 'not_found'})
+
+            c.executemany('''UPDATE saved_routes SET route_name = ?, city = ?, route_data = ?
+                             WHERE id = ? AND user_id = ?''', updates)
+            kept = {item['id'] for item in desired if isinstance(item, dict) and is_row_id(item.get('id'))}
+            removed = remove_routes(c, current_user_id, sorted(owned - kept))
+            added = add_routes(c, current_user_id, new_items)
+            for result in added:
+                result['index'] = new_indexes[result['index']]
+            return {'added': added, 'updated': updated, 'removed': removed}, 200
+
+        return run_batch(current_user_id, 'routes/sync', handler)
+
+    except Exception as e:
+        logger.error(f"Sync routes error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
+# ==================== SEARCH ====================
+
+SEARCH_MAX_PER_PAGE = 100
+
+# bm25 column weights: a hit in the name counts more than the city, the city more than an attraction
+SEARCH_TARGETS = {
+    'routes': {
+        'table': 'saved_routes_fts',
+        'bm25': 'bm25(saved_routes_fts, 10.0, 5.0, 1.0)',
+        'join': 'JOIN saved_routes r ON r.id = f.rowid',
+        'columns': ['id', 'user_id', 'route_name', 'city', 'route_data', 'created_at'],
+    },
+    'favorites': {
+        'table': 'favorites_fts',
+        'bm25': 'bm25(favorites_fts, 10.0, 5.0)',
+        'join': 'JOIN favorites r ON r.id = f.rowid',
+        'columns': ['id', 'user_id', 'place_id', 'place_name', 'city', 'created_at'],
+    },
+}
+
+def fts_query(text):
+    """Turn free text into an FTS5 query: every word must match, the last one as a prefix"""
+    words = re.findall(r'\w+', text)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+def search_args():
+    """Parse q, type, page and per_page, returns (args, error message)"""
+    query = fts_query(request.args.get('q', ''))
+    if not query:
+        return None, 'q is required'
+    kind = request.args.get('type', 'routes')
+    if kind not in SEARCH_TARGETS:
+        return None, f"type must be one of: {', '.join(SEARCH_TARGETS)}"
+    try:
+        page = max(1, int(request.args.get('page', 1)))
+        per_page = min(SEARCH_MAX_PER_PAGE, max(1, int(request.args.get('per_page', 20))))
+    except ValueError:
+        return None, 'page and per_page must be integers'
+    return {'query': query, 'type': kind, 'page': page, 'per_page': per_page}, None
+
+def run_search(args, user_id=None):
+    """Ranked page of matching routes or favorites, optionally limited to one user's rows"""
+    target = SEARCH_TARGETS[args['type']]
+    where = f"{target['table']} MATCH ?"
+    params = [args['query']]
+    if user_id is not None:
+        where += ' AND r.user_id = ?'
+        params.append(user_id)
+
+    conn = get_db()
+    c = conn.cursor()
+    c.execute(f"SELECT COUNT(*) FROM {target['table']} f {target['join']} WHERE {where}", params)
+    total = c.fetchone()[0]
+
+    columns = ', '.join(f'r.{column}' for column in target['columns'])
+    c.execute(f'''SELECT {columns}, u.username
+                  FROM {target['table']} f {target['join']}
+                  JOIN users u ON u.id = r.user_id
+                  WHERE {where}
+                  ORDER BY {target['bm25']}
+                  LIMIT ? OFFSET ?''',
+              params + [args['per_page'], (args['page'] - 1) * args['per_page']])
+    rows = c.fetchall()
+    conn.close()
+
+    results = []
+    for row in rows:
+        item = dict(zip(target['columns'] + ['username'], row))
+        if 'route_data' in item:
+            item['route_data'] = json.loads(item['route_data'])
+        results.append(item)
+
+    return {
+        'type': args['type'],
+        'page': args['page'],
+        'per_page': args['per_page'],
+        'total': total,
+        'results': results
+    }
+
+@api.route('/api/search', methods=['GET'])
+@token_required
+def search(current_user_id):
+    """Full-text search over the user's own routes or favorites"""
+    try:
+        args, error = search_args()
+        if error:
+            return jsonify({'error': error}), 400
+        return jsonify(run_search(args, user_id=current_user_id)), 200
+
+    except Exception as e:
+        logger.error(f"Search error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/admin/search', methods=['GET'])
+@token_required
+@admin_required
+def admin_search(current_user_id):
+    """Full-text search over every user's routes or favorites"""
+    try:
+        args, error = search_args()
+        if error:
+            return jsonify({'error': error}), 400
+        return jsonify(run_search(args)), 200
+
+    except Exception as e:
+        logger.error(f"Admin search error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
+# ==================== PHOTO PROXY ====================
+
+# Named widths clients can ask for; Google scales the photo down to at most this many pixels
+PHOTO_SIZES = {
+    'thumb': 200,
+    'medium': 400,
+    'large': 800,
+}
+
+PHOTO_REF_PATTERN = re.compile(r'^[A-Za-z0-9_-]{10,1024}$')
+PHOTO_MAX_AGE = 365 * 24 * 3600
+
+def photo_signature(photo_ref):
+    """HMAC of a photo reference, so only URLs we handed out can spend the Google photo quota"""
+    key = current_app.config['JWT_SECRET'].encode()
+    return hmac.new(key, f"photo:{photo_ref}".encode(), hashlib.sha256).hexdigest()[:32]
+
+def photo_cache_path(photo_ref, width):
+    """Where a photo variant lives on disk: a hash of reference and width, fanned out by prefix"""
+    digest = hashlib.sha256(f"{photo_ref}|{width}".encode()).hexdigest()
+    return os.path.join(current_app.config['PHOTO_CACHE_DIR'], digest[:2], digest)
+
+def photo_mimetype(path):
+    with open(path, 'rb') as f:
+        head = f.read(12)
+    if head.startswith(b'\x89PNG'):
+        return 'image/png'
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    if head.startswith(b'GIF8'):
+        return 'image/gif'
+    return 'image/jpeg'
+
+def photo_cache_files(cache_dir):
+    for root, _, names in os.walk(cache_dir):
+        for name in names:
+            if name.endswith('.tmp'):
+                # Another worker's download that is about to be renamed into place
+                continue
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            yield stat.st_atime, stat.st_size, path
+
+def evict_photos(cache_dir, max_bytes):
+    """Delete least recently used photos until the cache is under 90% of its byte budget"""
+    files = sorted(photo_cache_files(cache_dir))
+    total = sum(size for _, size, _ in files)
+    for _, size, path in files:
+        if total <= max_bytes * 0.9:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+    return total
+
+def store_photo(path, content):
+    """Write a downloaded photo atomically and keep the cache within PHOTO_CACHE_MAX_BYTES.
+
+    The byte total lives in photo_cache_usage and is updated under the SQLite
+    write lock together with the rename, so all workers account against one
+    budget. Only a missing row or an over-budget total rescans the directory.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(content)
+
+    cache_dir = current_app.config['PHOTO_CACHE_DIR']
+    max_bytes = current_app.config['PHOTO_CACHE_MAX_BYTES']
+    conn = get_db()
+    try:
+        c = conn.cursor()
+        c.execute('BEGIN IMMEDIATE')
+        try:
+            replaced = os.stat(path).st_size
+        except FileNotFoundError:
+            replaced = 0
+        os.replace(tmp_path, path)
+
+        c.execute('SELECT bytes FROM photo_cache_usage WHERE cache_dir = ?', (cache_dir,))
+        row = c.fetchone()
+        if row is None:
+            total = sum(size for _, size, _ in photo_cache_files(cache_dir))
+        else:
+            total = row[0] + len(content) - replaced
+        if total > max_bytes:
+            total = evict_photos(cache_dir, max_bytes)
+
+        c.execute('INSERT OR REPLACE INTO photo_cache_usage (cache_dir, bytes) VALUES (?, ?)', (cache_dir, total))
+        conn.commit()
+    finally:
+        conn.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def fetch_photo(photo_ref, width):
+    """Download a photo from Google, returns the image bytes or None"""
+    import requests
+
+    upstream_budget.acquire()
+    response = requests.get(
+        "https://maps.googleapis.com/maps/api/place/photo",
+        params={
+            'photoreference': photo_ref,
+            'maxwidth': width,
+            'key': current_app.config['GOOGLE_API_KEY']
+        },
+        timeout=10
+    )
+    if response.status_code != 200 or not response.headers.get('Content-Type', '').startswith('image/'):
+        logger.error(f"Photo fetch failed: HTTP {response.status_code}")
+        return None
+    return response.content
+
+def send_photo(path):
+    # A path (not a file object) lets the WSGI server hand the file to sendfile()
+    response = send_file(path, mimetype=photo_mimetype(path), conditional=True, etag=True,
+                         max_age=PHOTO_MAX_AGE)
+    response.headers['Cache-Control'] = f'public, max-age={PHOTO_MAX_AGE}, immutable'
+    return response
+
+@api.route('/api/photo/<photo_ref>', methods=['GET'])
+def get_photo(photo_ref):
+    """Serve a place photo from the disk cache, fetching it from Google on a miss"""
+    try:
+        size = request.args.get('size', 'large')
+        if size not in PHOTO_SIZES:
+            return jsonify({'error': f"size must be one of: {', '.join(PHOTO_SIZES)}"}), 400
+        if not PHOTO_REF_PATTERN.match(photo_ref):
+            return jsonify({'error': 'Invalid photo reference'}), 400
+        if not hmac.compare_digest(request.args.get('sig', ''), photo_signature(photo_ref)):
+            return jsonify({'error': 'Invalid photo signature'}), 403
+
+        path = photo_cache_path(photo_ref, PHOTO_SIZES[size])
+        try:
+            # Bump only the access time on a hit: eviction orders by it, while the
+            # unchanged mtime keeps ETag and Last-Modified stable for revalidation
+            os.utime(path, (time.time(), os.stat(path).st_mtime))
+            return send_photo(path)
+        except FileNotFoundError:
+            # Not cached, or another worker evicted it between the stat and the open
+            pass
+
+        if not current_app.config['GOOGLE_API_KEY']:
+            return jsonify({'error': 'Travel search is not configured'}), 503
+        content = fetch_photo(photo_ref, PHOTO_SIZES[size])
+        if not content:
+            return jsonify({'error': 'Photo not available'}), 502
+        store_photo(path, content)
+        return send_photo(path)
+
+    except Exception as e:
+        logger.error(f"Photo proxy error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
 # ==================== TRAVEL API ====================
 
-@app.route('/', methods=['GET'])
+@api.route('/', methods=['GET'])
 def index():
     try:
         return send_file('index.html', mimetype='text/html')
@@ -692,108 +1796,261 @@ def index():
             'version': '2.0.0',
         }), 200
 
-@app.route('/api/health', methods=['GET'])
+@api.route('/api/health', methods=['GET'])
 def health_check():
     return jsonify({
         'status': 'ok',
         'message': 'AI Travel Guide server is running ✅'
     }), 200
 
-@app.route('/api/generate-itinerary', methods=['POST'])
+@api.route('/api/ready', methods=['GET'])
+def readiness_check():
+    """Whether this worker can serve traffic: database usable and Google API configured"""
+    checks = {}
+    try:
+        ensure_db()
+        conn = get_db()
+        conn.execute('SELECT 1 FROM users LIMIT 1')
+        conn.close()
+        checks['database'] = 'ok'
+    except Exception as e:
+        logger.error(f"Readiness database error: {str(e)}")
+        checks['database'] = 'error'
+
+    checks['google_api'] = 'ok' if current_app.config['GOOGLE_API_KEY'] else 'GOOGLE_API_KEY not set'
+
+    ready = all(status == 'ok' for status in checks.values())
+    return jsonify({
+        'status': 'ready' if ready else 'not ready',
+        'checks': checks,
+        'cold_start_ms': current_app.config['COLD_START_MS'],
+        'uptime_seconds': round(time.perf_counter() - IMPORT_STARTED, 1)
+    }), 200 if ready else 503
+
+@api.route('/api/generate-itinerary', methods=['POST'])
 def generate_itinerary():
+    """Build an itinerary in the request, or as a background job with ?async=1"""
     try:
         data = request.json
-        city = data.get('city')
-        start_date = data.get('start_date')
-        end_date = data.get('end_date')
-        interests = data.get('interests', [])
 
-        if not city:
+        if not data.get('city'):
             return jsonify({'error': 'City is required'}), 400
 
-        geocode_result = geocode_address(city)
-        if not geocode_result:
-            return jsonify({'error': f'Could not find city: {city}'}), 404
-
-        location = f"{geocode_result['lat']},{geocode_result['lng']}"
-
-        all_attractions = []
-        seen_place_ids = set()
-
-        base_queries = [f'tourist attractions in {city}', f'things to do in {city}']
-
-        for query in base_queries[:5]:
-            places = text_search_places(query, location)
-            for place in places:
-                place_id = place['place_id']
-                if place_id in seen_place_ids:
-                    continue
-                seen_place_ids.add(place_id)
-
-                details = get_place_details(place_id)
-                if details:
-                    all_attractions.append({
-                        'name': details['name'],
-                        'category': 'Sightseeing',
-                        'description': f"Popular attraction with {details['user_ratings_total']} reviews",
-                        'address': details['formatted_address'],
-                        'rating': details['rating'],
-                        'phone': details['phone'],
-                        'website': details['website'],
-                        'opening_hours': details['opening_hours'],
-                        'photos': details['photos'],
-                        'reviews': details['reviews'],
-                        'duration': '2h',
-                        'place_id': place_id
-                    })
+        if not current_app.config['GOOGLE_API_KEY']:
+            return jsonify({'error': 'Travel search is not configured'}), 503
 
-                    if len(all_attractions) >= 15:
-                        break
+        if request.args.get('async') in ('1', 'true'):
+            return enqueue_itinerary_job(data)
 
-            if len(all_attractions) >= 15:
-                break
+        deadline = time.monotonic() + current_app.config['ITINERARY_DEADLINE_SECONDS']
+        body, status_code = plan_itinerary(data, deadline)
+        return jsonify(body), status_code
 
-        if start_date and end_date:
-            start = datetime.strptime(start_date, '%Y-%m-%d')
-            end = datetime.strptime(end_date, '%Y-%m-%d')
-            duration = (end - start).days + 1
-        else:
-            duration = 3
-
-        itinerary = []
-        for day in range(1, duration + 1):
-            itinerary.append({
-                'day': day,
-                'date': start_date if start_date else f'Day {day}',
-                'activities': all_attractions[:3],
-                'restaurants': []
-            })
+    except DeadlineExceeded as e:
+        return jsonify({'error': str(e)}), 504
+    except Exception as e:
+        logger.error(f"Generate itinerary error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
 
-        result = {
-            'city': city,
-            'duration_days': duration,
-            'total_attractions': len(all_attractions),
-            'total_restaurants': 0,
-            'selected_interests': interests,
-            'itinerary': itinerary,
-            'tips': []
-        }
+def plan_itinerary(data, deadline=None):
+    """The itinerary pipeline, returns (body, status code)"""
+    city = data.get('city')
+    start_date = data.get('start_date')
+    end_date = data.get('end_date')
+    interests = data.get('interests') or []
+
+    skeleton = build_city_skeleton(city, interests, deadline=deadline)
+    if not skeleton:
+        return {'error': f'Could not find city: {city}'}, 404
+
+    all_attractions = skeleton['attractions']
+
+    if start_date and end_date:
+        start = datetime.strptime(start_date, '%Y-%m-%d')
+        end = datetime.strptime(end_date, '%Y-%m-%d')
+        duration = (end - start).days + 1
+    else:
+        duration = 3
+
+    itinerary = []
+    for day in range(1, duration + 1):
+        # Walk down the ranked list so each day gets the next best places, wrapping on long trips
+        first = (day - 1) * 3 % max(len(all_attractions), 1)
+        itinerary.append({
+            'day': day,
+            'date': start_date if start_date else f'Day {day}',
+            'activities': (all_attractions[first:] + all_attractions[:first])[:3],
+            'restaurants': []
+        })
+
+    result = {
+        'city': city,
+        'duration_days': duration,
+        'total_attractions': len(all_attractions),
+        'total_restaurants': 0,
+        'selected_interests': interests,
+        'itinerary': itinerary,
+        'tips': []
+    }
+
+    return result, 200
+
+# ==================== JOBS ====================
+
+_job_pool_lock = threading.Lock()
+
+def get_job_pool():
+    """The bounded thread pool that runs this worker's itinerary jobs, started on first use"""
+    pool = current_app.extensions.get('job_pool')
+    if pool is None:
+        with _job_pool_lock:
+            pool = current_app.extensions.get('job_pool')
+            if pool is None:
+                pool = ThreadPoolExecutor(max_workers=current_app.config['JOB_WORKERS'],
+                                          thread_name_prefix='itinerary-job')
+                current_app.extensions['job_pool'] = pool
+    return pool
+
+def job_stale_before():
+    """Pending or running jobs not updated since this time were lost with their worker"""
+    return time.time() - 2 * current_app.config['ITINERARY_DEADLINE_SECONDS']
+
+def itinerary_request_hash(payload):
+    normalized = {
+        'city': city_key(payload['city']),
+        'start_date': payload['start_date'],
+        'end_date': payload['end_date'],
+        'interests': normalize_interests(payload['interests'])
+    }
+    return hashlib.sha256(json.dumps(normalized, sort_keys=True).encode()).hexdigest()
+
+def update_job(job_id, status, result=None, error=None):
+    conn = get_db()
+    c = conn.cursor()
+    c.execute('UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ? WHERE id = ?',
+              (status, json.dumps(result) if result is not None else None, error, time.time(), job_id))
+    conn.commit()
+    conn.close()
 
-        return jsonify(result), 200
+def run_itinerary_job(app, job_id, payload, deadline):
+    with app.app_context():
+        try:
+            check_deadline(deadline)
+            update_job(job_id, 'running')
+            body, status_code = plan_itinerary(payload, deadline)
+            if status_code == 200:
+                update_job(job_id, 'done', result=body)
+            else:
+                update_job(job_id, 'failed', error=body.get('error'))
+        except DeadlineExceeded as e:
+            update_job(job_id, 'failed', error=str(e))
+        except Exception as e:
+            logger.error(f"Itinerary job {job_id} error: {str(e)}")
+            update_job(job_id, 'failed', error=str(e))
+
+def job_response(job_id, status, status_code, **extra):
+    response = jsonify({
+        'job_id': job_id,
+        'status': status,
+        'status_url': f'/api/jobs/{job_id}',
+        **extra
+    })
+    response.headers['Location'] = f'/api/jobs/{job_id}'
+    return response, status_code
+
+def enqueue_itinerary_job(data):
+    """Queue an itinerary build, reusing an identical pending job and refusing work when the queue is full"""
+    payload = {
+        'city': data['city'],
+        'start_date': data.get('start_date'),
+        'end_date': data.get('end_date'),
+        'interests': data.get('interests') or []
+    }
+    request_hash = itinerary_request_hash(payload)
+    now = time.time()
+
+    conn = get_db()
+    conn.isolation_level = None
+    c = conn.cursor()
+    try:
+        c.execute('BEGIN IMMEDIATE')
+
+        c.execute('''SELECT id, status FROM jobs
+                     WHERE request_hash = ? AND status IN ('pending', 'running') AND updated_at > ?''',
+                  (request_hash, job_stale_before()))
+        existing = c.fetchone()
+        if existing:
+            c.execute('COMMIT')
+            return job_response(existing[0], existing[1], 202, deduplicated=True)
+
+        c.execute('''SELECT COUNT(*) FROM jobs WHERE status IN ('pending', 'running') AND updated_at > ?''',
+                  (job_stale_before(),))
+        if c.fetchone()[0] >= current_app.config['JOB_QUEUE_MAX']:
+            c.execute('ROLLBACK')
+            response = jsonify({'error': 'Too many itineraries are being generated, try again shortly'})
+            response.headers['Retry-After'] = '10'
+            return response, 503
+
+        job_id = uuid.uuid4().hex
+        c.execute('DELETE FROM jobs WHERE created_at < ?', (now - 24 * 3600,))
+        c.execute('''INSERT INTO jobs (id, request_hash, request, status, created_at, updated_at)
+                     VALUES (?, ?, ?, 'pending', ?, ?)''',
+                  (job_id, request_hash, json.dumps(payload), now, now))
+        c.execute('COMMIT')
+    except Exception:
+        if conn.in_transaction:
+            c.execute('ROLLBACK')
+        raise
+    finally:
+        conn.close()
+
+    deadline = time.monotonic() + current_app.config['ITINERARY_DEADLINE_SECONDS']
+    get_job_pool().submit(run_itinerary_job, current_app._get_current_object(), job_id, payload, deadline)
+    return job_response(job_id, 'pending', 202)
+
+@api.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Status of an itinerary job, with the itinerary once it is done"""
+    try:
+        conn = get_db()
+        c = conn.cursor()
+        c.execute('SELECT status, result, error, created_at, updated_at FROM jobs WHERE id = ?', (job_id,))
+        job = c.fetchone()
+        conn.close()
+
+        if not job:
+            return jsonify({'error': 'Job not found'}), 404
+
+        status, result, error, created_at, updated_at = job
+        if status in ('pending', 'running') and updated_at <= job_stale_before():
+            status, error = 'failed', 'Job was lost by its worker'
+            update_job(job_id, status, error=error)
+
+        body = {
+            'job_id': job_id,
+            'status': status,
+            'created_at': datetime.utcfromtimestamp(created_at).isoformat() + 'Z',
+            'updated_at': datetime.utcfromtimestamp(updated_at).isoformat() + 'Z'
+        }
+        if status == 'done':
+            body['result'] = json.loads(result)
+        if status == 'failed':
+            body['error'] = error
+        return jsonify(body), 200
 
     except Exception as e:
-        logger.error(f"Generate itinerary error: {str(e)}")
+        logger.error(f"Get job error: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
-@app.errorhandler(404)
+@api.app_errorhandler(404)
 def not_found(error):
     return jsonify({'error': 'Endpoint not found'}), 404
 
-@app.errorhandler(500)
+@api.app_errorhandler(500)
 def server_error(error):
     return jsonify({'error': 'Internal server error'}), 500
 
-@app.route('/api/admin/activity', methods=['GET'])
+@api.route('/api/admin/activity', methods=['GET'])
 @token_required
 @admin_required
 def get_activity(current_user_id):
@@ -803,12 +2060,12 @@ def get_activity(current_user_id):
         'message': 'No activity yet'
     }), 200
 
-@app.route('/api/export/db', methods=['GET'])
+@api.route('/api/export/db', methods=['GET'])
 @token_required
 @admin_required
 def export_database(current_user_id):
     try:
-        conn = sqlite3.connect('travelguide.db')
+        conn = get_db()
         c = conn.cursor()
 
         # Пользователи
@@ -839,7 +2096,66 @@ def export_database(current_user_id):
         return jsonify({'error': str(e)}), 500
 
 
+# ==================== APP FACTORY ====================
+
+def create_app(config=None):
+    """Build the Flask app without touching the database or any upstream API.
+
+    The schema is created on the first request and the Google client on the
+    first lookup, so creating an app is cheap enough for serverless cold starts.
+    """
+    from dotenv import load_dotenv
+    from flask_cors import CORS
+
+    load_dotenv()
+
+    app = Flask(__name__, static_folder='.', static_url_path='')
+    app.config.update(
+        GOOGLE_API_KEY=os.getenv('GOOGLE_API_KEY'),
+        JWT_SECRET=os.getenv('JWT_SECRET', 'dev-secret-key-change-in-production'),
+        DATABASE=os.getenv('DATABASE_PATH', 'travelguide.db'),
+        UPSTREAM_QPS=float(os.getenv('UPSTREAM_QPS', '10')),
+        PHOTO_CACHE_DIR=os.getenv('PHOTO_CACHE_DIR', 'photo_cache'),
+        PHOTO_CACHE_MAX_BYTES=int(os.getenv('PHOTO_CACHE_MAX_BYTES', str(512 * 1024 * 1024))),
+        JOB_WORKERS=int(os.getenv('JOB_WORKERS', '2')),
+        JOB_QUEUE_MAX=int(os.getenv('JOB_QUEUE_MAX', '20')),
+        ITINERARY_DEADLINE_SECONDS=int(os.getenv('ITINERARY_DEADLINE_SECONDS', '120')),
+    )
+    if config:
+        app.config.update(config)
+    # send_file resolves relative paths against the app root, the cache writes against the cwd
+    app.config['PHOTO_CACHE_DIR'] = os.path.abspath(app.config['PHOTO_CACHE_DIR'])
+
+    if not logging.getLogger().handlers:
+        logging.basicConfig(level=logging.INFO)
+    if not app.config['GOOGLE_API_KEY']:
+        logger.warning("GOOGLE_API_KEY not set, itinerary generation is disabled")
+
+    CORS(app, resources={
+        r"/api/*": {
+            "origins": ["*"],
+            "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+            "allow_headers": ["Content-Type", "Authorization", "Idempotency-Key"],
+            "supports_credentials": True,
+            "max_age": 3600
+        }
+    })
+
+    app.register_blueprint(api)
+    upstream_budget.set_rate(app.config['UPSTREAM_QPS'])
+
+    app.config['COLD_START_MS'] = round((time.perf_counter() - IMPORT_STARTED) * 1000, 1)
+    logger.info(f"App created in {app.config['COLD_START_MS']} ms since import")
+    return app
+
+def __getattr__(name):
+    # Keeps `flask_server_v3:app` working for old launch commands; built only when asked for
+    if name == 'app':
+        globals()['app'] = create_app()
+        return globals()['app']
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 if __name__ == '__main__':
     port = int(os.getenv('PORT', 8080))
-    app.run(debug=False, host='0.0.0.0', port=port)
+    create_app().run(debug=False, host='0.0.0.0', port=port)
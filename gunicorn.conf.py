@@ -0,0 +1,50 @@
+"""Gunicorn settings for running the API with several pre-forked workers.
+
+Every worker shares state only through SQLite (WAL mode), so the worker
+count can be raised freely. Tune with environment variables:
+
+    WEB_CONCURRENCY       number of worker processes (default: 2 * CPUs + 1)
+    GUNICORN_THREADS      threads per worker (default: 4)
+    UPSTREAM_QPS_TOTAL    Google calls per second shared by all workers (default: 10)
+"""
+import multiprocessing
+import os
+
+bind = f":{os.getenv('PORT', '8080')}"
+
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+worker_class = 'gthread'
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '0'))
+# Background itinerary jobs live in each worker's thread pool and finish before the worker
+# exits, so a restarting worker gets a full job deadline (plus slack) before it is killed
+graceful_timeout = int(os.getenv('ITINERARY_DEADLINE_SECONDS', '120')) + 15
+keepalive = 5
+
+# Recycle workers now and then so slow leaks never pile up, staggered to avoid restarting together
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '2000'))
+max_requests_jitter = max_requests // 10
+
+# Heartbeat files on tmpfs so a slow container disk never stalls the workers
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+# Build the app once in the master; workers fork from it and share its pages copy-on-write.
+# Safe because create_app() opens no DB connections or sockets.
+preload_app = True
+
+accesslog = '-'
+errorlog = '-'
+
+# Always split one upstream budget so N workers together stay within the Google quota;
+# this overrides any per-process UPSTREAM_QPS
+os.environ['UPSTREAM_QPS'] = str(float(os.getenv('UPSTREAM_QPS_TOTAL', '10')) / workers)
+
+def on_starting(server):
+    """Create the schema and switch to WAL once in the master, before any worker forks"""
+    from flask_server_v3 import cache_prune, create_app, ensure_db
+
+    with create_app().app_context():
+        ensure_db()
+        cache_prune()
@@ -0,0 +1,36 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import flask_server_v3
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'travelguide.db')
+
+
+@pytest.fixture
+def app(db_path, tmp_path):
+    return flask_server_v3.create_app({
+        'DATABASE': db_path,
+        'GOOGLE_API_KEY': 'AIza-test-key',
+        'JWT_SECRET': 'test-secret',
+        'PHOTO_CACHE_DIR': str(tmp_path / 'photos'),
+    })
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def auth_headers(client):
+    response = client.post('/api/register', json={
+        'username': 'traveler', 'email': 'traveler@example.com', 'password': 'secret123'
+    })
+    return {'Authorization': f"Bearer {response.get_json()['token']}"}
@@ -0,0 +1,118 @@
+import sqlite3
+
+import pytest
+
+LOUVRE = {'place_id': 'p-louvre', 'place_name': 'Louvre Museum', 'city': 'Paris'}
+ORSAY = {'place_id': 'p-orsay', 'place_name': "Musée d'Orsay", 'city': 'Paris'}
+
+LEGACY_FAVORITES = '''
+    CREATE TABLE favorites (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        place_id TEXT NOT NULL,
+        place_name TEXT NOT NULL,
+        city TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE INDEX idx_favorites_user_place ON favorites (user_id, place_id);
+'''
+
+
+def favorite_place_ids(client, headers):
+    response = client.get('/api/favorites', headers=headers)
+    assert response.status_code == 200
+    return sorted(fav['place_id'] for fav in response.get_json()['favorites'])
+
+
+@pytest.mark.parametrize('method, url', [
+    ('post', '/api/favorites/batch'),
+    ('put', '/api/favorites/sync'),
+    ('post', '/api/favorites/check'),
+    ('post', '/api/routes/batch'),
+    ('put', '/api/routes/sync'),
+])
+def test_batch_endpoints_reject_non_object_bodies(client, auth_headers, method, url):
+    response = getattr(client, method)(url, headers=auth_headers, json=[LOUVRE])
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Request body must be a JSON object'
+
+
+def test_single_and_batch_add_keep_one_favorite_per_place(client, auth_headers):
+    first = client.post('/api/favorites', headers=auth_headers, json=LOUVRE)
+    assert first.status_code == 201
+    again = client.post('/api/favorites', headers=auth_headers, json=LOUVRE)
+    assert again.status_code == 200
+    assert again.get_json()['favorite_id'] == first.get_json()['favorite_id']
+
+    response = client.post('/api/favorites/batch', headers=auth_headers, json={'add': [LOUVRE, ORSAY, ORSAY]})
+    assert response.status_code == 200
+    assert [r['status'] for r in response.get_json()['added']] == ['exists', 'added', 'exists']
+    assert favorite_place_ids(client, auth_headers) == ['p-louvre', 'p-orsay']
+
+
+def test_batch_remove_and_check(client, auth_headers):
+    client.post('/api/favorites/batch', headers=auth_headers, json={'add': [LOUVRE, ORSAY]})
+
+    response = client.post('/api/favorites/check', headers=auth_headers,
+                           json={'place_ids': ['p-louvre', 'p-orsay', 'p-missing']})
+    favorites = response.get_json()['favorites']
+    assert favorites['p-louvre'] and favorites['p-orsay'] and favorites['p-missing'] is None
+
+    response = client.post('/api/favorites/batch', headers=auth_headers,
+                           json={'remove': [{'place_id': 'p-louvre'}, {'place_id': 'p-missing'}]})
+    assert [r['status'] for r in response.get_json()['removed']] == ['removed', 'not_found']
+
+    response = client.post('/api/favorites/check', headers=auth_headers, json={'place_ids': ['p-louvre']})
+    assert response.get_json()['favorites'] == {'p-louvre': None}
+
+
+def test_sync_makes_favorites_match_the_list(client, auth_headers):
+    client.post('/api/favorites', headers=auth_headers, json=LOUVRE)
+
+    response = client.put('/api/favorites/sync', headers=auth_headers, json={'favorites': [ORSAY]})
+    assert response.status_code == 200
+    assert [r['status'] for r in response.get_json()['removed']] == ['removed']
+    assert favorite_place_ids(client, auth_headers) == ['p-orsay']
+
+
+def test_idempotency_key_replays_and_rejects_a_different_body(client, auth_headers):
+    headers = dict(auth_headers, **{'Idempotency-Key': 'k1'})
+    first = client.post('/api/favorites/batch', headers=headers, json={'add': [LOUVRE]})
+    assert first.status_code == 200
+
+    client.post('/api/favorites/batch', headers=auth_headers, json={'remove': [{'place_id': 'p-louvre'}]})
+
+    replay = client.post('/api/favorites/batch', headers=headers, json={'add': [LOUVRE]})
+    assert replay.status_code == 200
+    assert replay.headers['Idempotent-Replayed'] == 'true'
+    assert replay.get_json() == first.get_json()
+    assert favorite_place_ids(client, auth_headers) == []
+
+    response = client.post('/api/favorites/batch', headers=headers, json={'add': [ORSAY]})
+    assert response.status_code == 422
+
+
+def test_upgrade_folds_duplicate_favorites(db_path, client):
+    conn = sqlite3.connect(db_path)
+    conn.executescript(LEGACY_FAVORITES)
+    conn.executemany('INSERT INTO favorites (user_id, place_id, place_name, city) VALUES (?, ?, ?, ?)',
+                     [(1, 'p-louvre', 'Louvre Museum', 'Paris'),
+                      (1, 'p-louvre', 'Louvre', 'Paris'),
+                      (1, 'p-orsay', "Musée d'Orsay", 'Paris'),
+                      (2, 'p-louvre', 'Louvre Museum', 'Paris')])
+    conn.commit()
+    conn.close()
+
+    assert client.get('/api/ready').status_code == 200
+    response = client.post('/api/register', json={
+        'username': 'traveler', 'email': 'traveler@example.com', 'password': 'secret123'
+    })
+    headers = {'Authorization': f"Bearer {response.get_json()['token']}"}
+
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute('SELECT id, user_id, place_id FROM favorites ORDER BY id').fetchall()
+    conn.close()
+    assert rows == [(1, 1, 'p-louvre'), (3, 1, 'p-orsay'), (4, 2, 'p-louvre')]
+
+    response = client.post('/api/favorites/check', headers=headers, json={'place_ids': ['p-louvre']})
+    assert response.get_json()['favorites'] == {'p-louvre': 1}
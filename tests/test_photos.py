@@ -0,0 +1,78 @@
+import multiprocessing
+import os
+import sqlite3
+
+import flask_server_v3
+
+PHOTO_REF = 'CmRaAAAA-photo-reference'
+PNG = b'\x89PNG\r\n\x1a\n' + b'\0' * 1016
+
+
+def photo_url(app, ref=PHOTO_REF, size='thumb'):
+    with app.app_context():
+        sig = flask_server_v3.photo_signature(ref)
+    return f'/api/photo/{ref}?size={size}&sig={sig}'
+
+
+def disk_bytes(cache_dir):
+    return sum(size for _, size, _ in flask_server_v3.photo_cache_files(cache_dir))
+
+
+def store_many(config, worker, count):
+    app = flask_server_v3.create_app(config)
+    with app.app_context():
+        for i in range(count):
+            path = flask_server_v3.photo_cache_path(f'worker{worker}-photo{i:04d}', 200)
+            flask_server_v3.store_photo(path, os.urandom(1024))
+
+
+def test_byte_budget_holds_across_worker_processes(app, client, db_path):
+    assert client.get('/api/ready').status_code == 200
+    config = {key: app.config[key] for key in ('DATABASE', 'GOOGLE_API_KEY', 'JWT_SECRET', 'PHOTO_CACHE_DIR')}
+    config['PHOTO_CACHE_MAX_BYTES'] = 16 * 1024
+
+    ctx = multiprocessing.get_context('fork')
+    workers = [ctx.Process(target=store_many, args=(config, worker, 24)) for worker in range(4)]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join(60)
+        assert process.exitcode == 0
+
+    cache_dir = config['PHOTO_CACHE_DIR']
+    assert disk_bytes(cache_dir) <= config['PHOTO_CACHE_MAX_BYTES']
+
+    conn = sqlite3.connect(db_path)
+    (recorded,) = conn.execute('SELECT bytes FROM photo_cache_usage WHERE cache_dir = ?', (cache_dir,)).fetchone()
+    conn.close()
+    assert recorded == disk_bytes(cache_dir)
+
+
+def test_photo_evicted_during_a_hit_is_fetched_again(app, client, monkeypatch):
+    assert client.get('/api/ready').status_code == 200
+    with app.app_context():
+        path = flask_server_v3.photo_cache_path(PHOTO_REF, 200)
+        flask_server_v3.store_photo(path, PNG)
+
+    fetched = []
+
+    def fetch_photo(photo_ref, width):
+        fetched.append((photo_ref, width))
+        return PNG
+
+    real_utime = os.utime
+
+    def utime_after_eviction(target, times=None):
+        # Another worker evicts the file right after this one saw it on disk
+        if target == path and not fetched:
+            os.remove(target)
+        return real_utime(target, times)
+
+    monkeypatch.setattr(flask_server_v3, 'fetch_photo', fetch_photo)
+    monkeypatch.setattr(flask_server_v3.os, 'utime', utime_after_eviction)
+
+    response = client.get(photo_url(app))
+    assert response.status_code == 200
+    assert response.mimetype == 'image/png'
+    assert response.data == PNG
+    assert fetched == [(PHOTO_REF, 200)]
@@ -0,0 +1,148 @@
+import sqlite3
+
+import pytest
+
+# route_data is free-form client JSON; none of these may break saving or indexing
+ODD_ROUTE_DATA = [
+    {'itinerary': 'x'},
+    {'itinerary': [{'activities': ['Colosseum']}]},
+    {'itinerary': [{'activities': 'Colosseum'}]},
+    {'itinerary': ['day one', 3, None]},
+    {'itinerary': [{'activities': [{'name': 5}, {'name': ['Louvre']}, {'name': None}]}]},
+    {'itinerary': {'activities': [{'name': 'Louvre'}]}},
+    ['not', 'an', 'object'],
+    'just text',
+]
+
+LOUVRE_ROUTE = {
+    'city': 'Paris',
+    'itinerary': [{'activities': [{'name': 'Musée du Louvre'}, 'stray', {'name': 7}]}],
+}
+
+BASELINE_SCHEMA = '''
+    CREATE TABLE users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE NOT NULL,
+        email TEXT UNIQUE NOT NULL,
+        password_hash TEXT NOT NULL,
+        is_admin INTEGER DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE saved_routes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        route_name TEXT NOT NULL,
+        city TEXT NOT NULL,
+        route_data TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    );
+    CREATE TABLE favorites (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        place_id TEXT NOT NULL,
+        place_name TEXT NOT NULL,
+        city TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    );
+'''
+
+
+def search(client, headers, q, kind='routes'):
+    response = client.get('/api/search', query_string={'q': q, 'type': kind}, headers=headers)
+    assert response.status_code == 200
+    return response.get_json()
+
+
+@pytest.mark.parametrize('route_data', ODD_ROUTE_DATA)
+def test_save_route_accepts_any_route_data(client, auth_headers, route_data):
+    response = client.post('/api/routes', headers=auth_headers, json={
+        'route_name': 'Odd trip', 'city': 'Rome', 'route_data': route_data
+    })
+    assert response.status_code == 201
+    assert search(client, auth_headers, 'odd')['total'] == 1
+
+
+def test_batch_and_sync_accept_any_route_data(client, auth_headers):
+    routes = [{'route_name': f'Trip {i}', 'city': 'Rome', 'route_data': data}
+              for i, data in enumerate(ODD_ROUTE_DATA)]
+    response = client.post('/api/routes/batch', headers=auth_headers, json={'add': routes})
+    assert response.status_code == 200
+    added = response.get_json()['added']
+    assert [r['status'] for r in added] == ['added'] * len(routes)
+
+    synced = [dict(route, id=result['route_id'], route_data=LOUVRE_ROUTE)
+              for route, result in zip(routes, added)]
+    synced[0]['route_data'] = {'itinerary': 'x'}
+    response = client.put('/api/routes/sync', headers=auth_headers, json={'routes': synced})
+    assert response.status_code == 200
+
+    assert search(client, auth_headers, 'louvre')['total'] == len(routes) - 1
+    assert search(client, auth_headers, 'trip')['total'] == len(routes)
+
+
+def test_route_search_indexes_text_attraction_names(client, auth_headers):
+    client.post('/api/routes', headers=auth_headers, json={
+        'route_name': 'Weekend', 'city': 'Paris', 'route_data': LOUVRE_ROUTE
+    })
+    results = search(client, auth_headers, 'musee louv')['results']
+    assert [r['route_name'] for r in results] == ['Weekend']
+    assert search(client, auth_headers, 'stray')['total'] == 0
+
+
+def test_upgrade_with_legacy_rows_holding_odd_route_data(db_path, app, client):
+    conn = sqlite3.connect(db_path)
+    conn.executescript(BASELINE_SCHEMA)
+    conn.execute("INSERT INTO users (username, email, password_hash) VALUES ('old', 'old@example.com', 'x')")
+    conn.executemany('INSERT INTO saved_routes (user_id, route_name, city, route_data) VALUES (1, ?, ?, ?)',
+                     [('Legacy odd', 'Rome', '{"itinerary":"x"}'),
+                      ('Legacy scalars', 'Rome', '{"itinerary":[{"activities":["Colosseum"]}]}'),
+                      ('Legacy good', 'Paris', '{"itinerary":[{"activities":[{"name":"Louvre"}]}]}')])
+    conn.execute("INSERT INTO favorites (user_id, place_id, place_name, city) VALUES (1, 'p1', 'Louvre Museum', 'Paris')")
+    conn.commit()
+    conn.close()
+
+    assert client.get('/api/ready').status_code == 200
+
+    response = client.post('/api/register', json={
+        'username': 'admin', 'email': 'admin@example.com', 'password': 'secret123'
+    })
+    assert response.status_code == 201
+    headers = {'Authorization': f"Bearer {response.get_json()['token']}"}
+    assert client.post('/api/login', json={'username': 'admin', 'password': 'secret123'}).status_code == 200
+
+    # The second account is not the first user, so promote it to search across all users
+    conn = sqlite3.connect(db_path)
+    conn.execute("UPDATE users SET is_admin = 1 WHERE username = 'admin'")
+    conn.commit()
+    conn.close()
+
+    response = client.get('/api/admin/search', query_string={'q': 'legacy'}, headers=headers)
+    assert response.status_code == 200
+    assert response.get_json()['total'] == 3
+
+    response = client.get('/api/admin/search', query_string={'q': 'louvre'}, headers=headers)
+    assert [r['route_name'] for r in response.get_json()['results']] == ['Legacy good']
+
+    response = client.get('/api/admin/search', query_string={'q': 'louvre', 'type': 'favorites'}, headers=headers)
+    assert response.get_json()['total'] == 1
+
+
+def test_init_db_failure_does_not_hold_the_write_lock(db_path, app, monkeypatch):
+    import flask_server_v3
+
+    def broken_schema(conn):
+        conn.execute('CREATE TABLE half_done (id INTEGER)')
+        conn.execute('INSERT INTO half_done VALUES (1)')
+        raise sqlite3.OperationalError('boom')
+
+    monkeypatch.setattr(flask_server_v3, 'create_schema', broken_schema)
+    with app.app_context():
+        with pytest.raises(sqlite3.OperationalError):
+            flask_server_v3.init_db()
+
+    conn = sqlite3.connect(db_path, timeout=0.1)
+    conn.execute('CREATE TABLE other_writer (id INTEGER)')
+    conn.commit()
+    conn.close()
@@ -0,0 +1,140 @@
+"""Warm the shared API cache for the most requested cities.
+
+Precomputes geocode, search results, place details and the itinerary
+skeleton for each city and interest set so that /api/generate-itinerary is served from
+the api_cache table. Entries are refreshed before they expire.
+
+Usage:
+    python warmup.py                      # warm top cities once
+    python warmup.py --cities Paris,Rome  # warm an explicit list
+    python warmup.py --loop               # keep refreshing in the background
+    python warmup.py --interests history,food+nightlife
+"""
+import argparse
+import os
+import time
+
+from flask_server_v3 import (
+    CACHE_TTL, INTEREST_PROFILES, build_city_skeleton, cache_expires_at, cache_prune, city_key, create_app,
+    ensure_db, get_db, logger, skeleton_key, upstream_budget
+)
+
+def top_cities(limit):
+    """Most frequent cities across saved routes and favorites"""
+    conn = get_db()
+    c = conn.cursor()
+    c.execute('''
+        SELECT MIN(city), COUNT(*) AS hits FROM (
+            SELECT city FROM saved_routes
+            UNION ALL
+            SELECT city FROM favorites
+        )
+        GROUP BY LOWER(TRIM(city))
+        ORDER BY hits DESC
+        LIMIT ?
+    ''', (limit,))
+    cities = [row[0] for row in c.fetchall()]
+    conn.close()
+    return cities
+
+def warm_city(city, interests, margin):
+    """Rebuild a skeleton if it is missing or expires within margin seconds"""
+    expires_at = cache_expires_at(skeleton_key(city, interests))
+    if expires_at and expires_at - time.time() > margin:
+        return 'fresh'
+
+    skeleton = build_city_skeleton(city, interests, refresh=True)
+    if not skeleton or not skeleton['attractions']:
+        return 'failed'
+    return 'warmed'
+
+def run_once(cities, interest_sets, margin):
+    stats = {'fresh': 0, 'warmed': 0, 'failed': 0}
+    for city in cities:
+        for interests in interest_sets:
+            label = '+'.join(interests)
+            try:
+                status = warm_city(city, interests, margin)
+            except Exception as e:
+                logger.error(f"Warm-up error for {city} ({label}): {str(e)}")
+                status = 'failed'
+            stats[status] += 1
+            logger.info(f"Warm-up {city} ({label}): {status}")
+    return stats
+
+def parse_interest_sets(value):
+    """'history,food+nightlife' -> [['history'], ['food', 'nightlife']]; 'all' is every single profile"""
+    if value.strip() == 'all':
+        return [[interest] for interest in INTEREST_PROFILES]
+    sets = []
+    for group in value.split(','):
+        interests = [i.strip().lower() for i in group.split('+') if i.strip()]
+        if not interests:
+            continue
+        unknown = set(interests) - set(INTEREST_PROFILES)
+        if unknown:
+            raise ValueError(f"unknown interests: {', '.join(sorted(unknown))}")
+        sets.append(interests)
+    return sets
+
+def resolve_cities(args):
+    cities = []
+    if args.cities:
+        cities.extend(c.strip() for c in args.cities.split(',') if c.strip())
+    if args.top:
+        cities.extend(top_cities(args.top))
+
+    unique = {}
+    for city in cities:
+        unique.setdefault(city_key(city), city)
+    return list(unique.values())
+
+def run(args):
+    while True:
+        cities = resolve_cities(args)
+        stats = run_once(cities, args.interest_sets, args.margin)
+        pruned = cache_prune()
+        logger.info(f"Warm-up pass done: {len(cities)} cities x {len(args.interest_sets)} interest sets, "
+                    f"{stats}, {pruned} expired entries pruned")
+        if not args.loop:
+            break
+        time.sleep(args.interval)
+
+def main():
+    parser = argparse.ArgumentParser(description='Precompute itinerary data for top cities')
+    parser.add_argument('--cities', default=os.getenv('WARMUP_CITIES', ''),
+                        help='comma-separated cities to always warm')
+    parser.add_argument('--top', type=int, default=int(os.getenv('WARMUP_TOP_CITIES', '30')),
+                        help='also warm the N most saved/favorited cities')
+    parser.add_argument('--interests', default=os.getenv('WARMUP_INTERESTS', 'all'),
+                        help="interest sets to warm: comma-separated, '+' joins a multi-interest set; "
+                             "'all' warms sightseeing and each single interest")
+    parser.add_argument('--qps', type=float, default=float(os.getenv('WARMUP_QPS', '2')),
+                        help='upstream Google calls per second for this job')
+    parser.add_argument('--margin', type=int, default=int(os.getenv('WARMUP_MARGIN', '3600')),
+                        help='refresh entries expiring within this many seconds')
+    parser.add_argument('--loop', action='store_true', help='keep running and refresh periodically')
+    parser.add_argument('--interval', type=int, default=int(os.getenv('WARMUP_INTERVAL', '900')),
+                        help='seconds between passes in --loop mode')
+    args = parser.parse_args()
+
+    try:
+        args.interest_sets = parse_interest_sets(args.interests)
+    except ValueError as e:
+        parser.error(f'--interests: {e}')
+    if not args.interest_sets:
+        parser.error('--interests must name at least one interest set')
+    if not args.qps > 0:
+        parser.error('--qps must be greater than 0')
+    if args.loop and args.interval >= args.margin:
+        parser.error('--interval must be shorter than --margin so entries refresh before expiry')
+    if args.margin >= CACHE_TTL['skeleton']:
+        parser.error(f"--margin must be shorter than the skeleton TTL ({CACHE_TTL['skeleton']}s)")
+
+    with create_app().app_context():
+        ensure_db()
+        upstream_budget.set_rate(args.qps)
+        run(args)
+
+if __name__ == '__main__':
+    main()